@@ -0,0 +1,299 @@
+import numpy as np     # only needed for batch runs, the game itself doesn't use numpy
+
+from constants import *
+from game import seconds_to_ticks
+from maze import MazeGrid, EMPTY_CODE, COIN_CODE, BIGCOIN_CODE, GHOST_CODE
+from pathfinding import DIRECTIONS, load_path_table, PATH_TABLE_HEADER, PATH_TABLE_UNREACHABLE
+
+# many games of the same map and level in numpy arrays, every tick advances all of them at once
+# same rules as game.Game (see Game.tick()), but the random choices come from one numpy generator,
+# so single games differ from Game with the same seed while the statistics are the same
+# pending coin respawns are kept in buckets per due tick; a block can have several of them, like in RespawnScheduler
+
+NO_BLOCK = -1
+STAY = -1       # action: don't move; 0-3 are the direction codes (O, W, S, N)
+UNREACHABLE_DISTANCE = np.iinfo(np.int32).max
+
+
+class BatchGame:
+    def __init__(self, rows, lvl, games, spawn="random", seed=None, path_table_cache=PATH_TABLE_CACHE_DIR):
+        maze = MazeGrid(rows)
+        self.width = maze.width
+        self.height = maze.height
+        self.lvl = lvl
+        self.games = games
+        self.random = np.random.default_rng(seed)
+
+        # blocks: the walkable cells, positions are stored as block ids
+        cells = np.frombuffer(bytes(maze.cells), dtype=np.uint8)
+        self.block_cell = np.flatnonzero(np.frombuffer(bytes(maze.walkable()), dtype=np.uint8)).astype(np.int32)    # block id: cell index
+        self.block_x = self.block_cell % self.width + 1     # starting from 1x1 like everywhere else
+        self.block_y = self.block_cell // self.width + 1
+        cell_block = np.full(len(cells), NO_BLOCK, dtype=np.int32)
+        cell_block[self.block_cell] = np.arange(len(self.block_cell), dtype=np.int32)
+
+        self.links = np.full((len(self.block_cell), 4), NO_BLOCK, dtype=np.int32)    # neighbour block id per direction
+        for direction, (dx, dy) in enumerate(DIRECTIONS):
+            x = self.block_x + dx
+            y = self.block_y + dy
+            inside = (x >= 1) & (x <= self.width) & (y >= 1) & (y <= self.height)
+            self.links[inside, direction] = cell_block[(y[inside] - 1) * self.width + (x[inside] - 1)]
+        self.open_count = (self.links != NO_BLOCK).sum(axis=1)      # per block: how many directions aren't walls
+        self.open_directions = np.argsort(self.links == NO_BLOCK, axis=1, kind="stable")    # these directions first
+
+        path_table = load_path_table(maze, path_table_cache)
+        if path_table is not None:     # every distance field there can be, one row per target block
+            self.table = np.frombuffer(path_table.mmap, dtype="<u2", offset=PATH_TABLE_HEADER.size).reshape(path_table.blocks, path_table.blocks)
+        else:
+            self.table = None       # too big, distance fields are searched per tick instead
+
+        self.cells = np.tile(cells, (games, 1))     # (games, height * width), ascii codes like MazeGrid
+        self.ticks = 0
+        self.alive = np.ones(games, dtype=bool)
+        self.death_tick = np.zeros(games, dtype=np.int64)
+        self.coins = np.zeros(games, dtype=np.int64)
+        self.bigcoins = np.zeros(games, dtype=np.int64)    # visible bigcoins, same as count_symbol(BIGCOIN_SYMBOL)
+        self.player_cooldown = seconds_to_ticks(0.5)
+        self.move_ready_tick = np.zeros(games, dtype=np.int64)
+
+        # ghosts: one column per summon, a game whose summon failed has an inactive ghost in that column
+        # ghosts of one column are summoned on the same tick and move every cooldown, so they share the next move tick
+        self.ghost_cooldown = seconds_to_ticks(0.5)
+        self.ghost_spawn_lock = seconds_to_ticks(5)
+        self.ghost_block = np.zeros((games, 0), dtype=np.int32)
+        self.ghost_old = np.zeros((games, 0), dtype=np.uint8)     # symbol code the ghost is standing on
+        self.ghost_active = np.zeros((games, 0), dtype=bool)
+        self.ghost_next_move = []       # per column
+
+        self.respawns = {}      # tick: list of (games, blocks) coin respawns due on that tick
+
+        all_games = np.arange(games)
+        if spawn == "random":
+            self.player_block = self.random_blocks(all_games, exclude_player=False)
+        else:
+            self.player_block = np.full(games, cell_block[(spawn[1] - 1) * self.width + (spawn[0] - 1)], dtype=np.int32)
+        on_coin = self.cells[all_games, self.block_cell[self.player_block]] == COIN_CODE     # if player spawns on coin
+        self.cells[on_coin, self.block_cell[self.player_block[on_coin]]] = EMPTY_CODE
+        self.coins[on_coin] += COIN_VALUE
+        self.schedule_coins(all_games[on_coin], self.player_block[on_coin], seconds_to_ticks(COIN_RESPAWN_TIME))
+
+        for i in range(GHOST_START_COUNT[lvl]):
+            self.summon_ghosts()
+
+        self.next_ghost_tick = seconds_to_ticks(GHOST_SPAWN_INTERVAL[lvl])
+        self.next_bigcoin_tick = self.next_bigcoin_delays(games)
+
+    @property
+    def mazes(self):    # (games, height, width) view of the cells
+        return self.cells.reshape(self.games, self.height, self.width)
+
+    def positions(self, blocks):    # block ids to (x, y) arrays
+        return self.block_x[blocks], self.block_y[blocks]
+
+    def next_bigcoin_delays(self, count):
+        return self.ticks + self.random.integers(BIGCOIN_SUMMON_MIN, BIGCOIN_SUMMON_MAX + 1, count) * seconds_to_ticks(1)
+
+    def random_blocks(self, games, exclude_player=True, within=None):     # one random empty or coin block per game, NO_BLOCK if there is none
+        symbols = self.cells[games[:, None], self.block_cell[None, :]]
+        allowed = (symbols == EMPTY_CODE) | (symbols == COIN_CODE)
+        if within is not None:  # (games, blocks) mask of the blocks to choose from
+            allowed &= within
+        elif exclude_player:      # like get_random_spawn_block(): not in the row or column of the player
+            player = self.player_block[games]
+            allowed &= (self.block_x[None, :] != self.block_x[player][:, None]) & (self.block_y[None, :] != self.block_y[player][:, None])
+        keys = self.random.random(allowed.shape)
+        keys[~allowed] = -1     # uniform choice among the allowed blocks
+        choice = keys.argmax(axis=1).astype(np.int32)
+        choice[~allowed.any(axis=1)] = NO_BLOCK
+        return choice
+
+    def schedule_coins(self, games, blocks, in_ticks):
+        if len(games):
+            self.respawns.setdefault(self.ticks + in_ticks, []).append((games, blocks))
+
+    def summon_ghosts(self):    # one ghost in every running game
+        games = np.flatnonzero(self.alive)
+        blocks = self.random_blocks(games, within=self.far_blocks(games))     # like get_ghost_spawn_block()
+        missing = blocks == NO_BLOCK
+        blocks[missing] = self.random_blocks(games[missing])
+        found = blocks != NO_BLOCK
+        games, blocks = games[found], blocks[found]
+
+        column_block = np.zeros(self.games, dtype=np.int32)
+        column_old = np.full(self.games, EMPTY_CODE, dtype=np.uint8)
+        column_active = np.zeros(self.games, dtype=bool)
+        column_block[games] = blocks
+        column_old[games] = self.cells[games, self.block_cell[blocks]]
+        column_active[games] = True
+        self.cells[games, self.block_cell[blocks]] = GHOST_CODE
+
+        self.ghost_block = np.column_stack((self.ghost_block, column_block))
+        self.ghost_old = np.column_stack((self.ghost_old, column_old))
+        self.ghost_active = np.column_stack((self.ghost_active, column_active))
+        self.ghost_next_move.append(self.ticks + self.ghost_spawn_lock)
+
+    def summon_bigcoins(self, games):
+        blocks = self.random_blocks(games)
+        found = blocks != NO_BLOCK
+        games, blocks = games[found], blocks[found]
+        cells = self.block_cell[blocks]
+        was_coin = self.cells[games, cells] == COIN_CODE
+        self.cells[games, cells] = BIGCOIN_CODE
+        self.bigcoins[games] += 1
+        self.schedule_coins(games[was_coin], blocks[was_coin], seconds_to_ticks(COIN_RESPAWN_TIME))     # make sure the normal coin respawns again
+
+    def kill(self, games):
+        self.alive[games] = False
+        self.death_tick[games] = self.ticks
+
+    def player_distances(self, games):     # returns distance(rows, blocks) towards the player of games[rows]
+        targets = self.player_block[games]
+        if self.table is not None:
+            return lambda rows, blocks: self.table[blocks, targets[rows]].astype(np.int32)
+
+        # batched bfs: one distance field per game, all fields grow one layer per step
+        blocks_count = len(self.block_cell)
+        links = np.where(self.links == NO_BLOCK, blocks_count, self.links)     # points to a padding column that is never reached
+        dist = np.full((len(games), blocks_count + 1), UNREACHABLE_DISTANCE, dtype=np.int32)
+        frontier = np.zeros((len(games), blocks_count + 1), dtype=bool)
+        frontier[np.arange(len(games)), targets] = True
+        dist[frontier] = 0
+        step = 0
+        while frontier.any():
+            step += 1
+            reached = frontier[:, links[:, 0]] | frontier[:, links[:, 1]] | frontier[:, links[:, 2]] | frontier[:, links[:, 3]]
+            reached &= dist[:, :blocks_count] == UNREACHABLE_DISTANCE
+            frontier[:, :blocks_count] = reached
+            dist[:, :blocks_count][reached] = step
+        return lambda rows, blocks: dist[rows, blocks]
+
+    def far_blocks(self, games):    # (games, blocks) mask: at least GHOST_SPAWN_MIN_DISTANCE steps away from the player
+        d = self.player_distances(games)(np.arange(len(games))[:, None], np.arange(len(self.block_cell))[None, :])
+        return (d >= GHOST_SPAWN_MIN_DISTANCE) & (d != PATH_TABLE_UNREACHABLE) & (d != UNREACHABLE_DISTANCE)
+
+    def next_steps(self, distance, rows, blocks):     # direction towards the player like Ghost.get_next_step(), STAY if there is none
+        d = distance(rows, blocks)
+        neighbours = self.links[blocks]
+        options = np.zeros((len(rows), 4), dtype=bool)
+        for direction in range(4):
+            nb = neighbours[:, direction]
+            options[:, direction] = (nb != NO_BLOCK) & (distance(rows, np.maximum(nb, 0)) == d - 1)
+        options &= ((d > 0) & (d != PATH_TABLE_UNREACHABLE) & (d != UNREACHABLE_DISTANCE))[:, None]    # already there or unreachable
+
+        if self.lvl == "hard":      # random choice on equally short ways
+            keys = self.random.random(options.shape)
+            keys[~options] = -1
+            steps = keys.argmax(axis=1)
+        else:                       # first way in direction order
+            steps = options.argmax(axis=1)
+        return np.where(options.any(axis=1), steps, STAY)
+
+    def move_players(self, actions):      # actions: direction code or STAY per game, only used where the player can move
+        games = np.flatnonzero(self.alive & (self.move_ready_tick <= self.ticks) & (actions != STAY))
+        targets = self.links[self.player_block[games], actions[games]]
+        games, targets = games[targets != NO_BLOCK], targets[targets != NO_BLOCK]     # walls and the border block the move
+        self.player_block[games] = targets
+        self.move_ready_tick[games] = self.ticks + self.player_cooldown
+
+        cells = self.block_cell[targets]
+        symbols = self.cells[games, cells]
+        coin = symbols == COIN_CODE
+        bigcoin = symbols == BIGCOIN_CODE
+        self.cells[games[coin | bigcoin], cells[coin | bigcoin]] = EMPTY_CODE
+        self.coins[games[coin]] += COIN_VALUE
+        self.coins[games[bigcoin]] += BIGCOIN_VALUE
+        self.bigcoins[games[bigcoin]] -= 1
+        self.schedule_coins(games[coin], targets[coin], seconds_to_ticks(COIN_RESPAWN_TIME))
+        self.kill(games[symbols == GHOST_CODE])
+
+    def move_ghosts(self):
+        columns = [ghost for ghost, next_move in enumerate(self.ghost_next_move) if next_move <= self.ticks]
+        if not columns:
+            return
+        due = self.ghost_active[:, columns] & self.alive[:, None]
+        games_with_moves = np.flatnonzero(due.any(axis=1))
+        distance = self.player_distances(games_with_moves)      # the player doesn't move during the ghost moves
+        row_of_game = np.zeros(self.games, dtype=np.int64)
+        row_of_game[games_with_moves] = np.arange(len(games_with_moves))
+
+        for column, ghost in enumerate(columns):     # one ghost after the other like in Game.tick(), all games at once
+            self.ghost_next_move[ghost] = self.ticks + self.ghost_cooldown
+            games = np.flatnonzero(due[:, column] & self.alive)     # a ghost before could have killed the player
+            if not len(games):
+                continue
+            blocks = self.ghost_block[games, ghost]
+            steps = self.next_steps(distance, row_of_game[games], blocks)
+            moving = steps != STAY
+            games, blocks, steps = games[moving], blocks[moving], steps[moving]
+            targets = self.links[blocks, steps]
+
+            target_symbols = self.cells[games, self.block_cell[targets]]
+            free = target_symbols != GHOST_CODE    # another ghost has to move first
+            games, blocks, targets, target_symbols = games[free], blocks[free], targets[free], target_symbols[free]
+
+            old = self.ghost_old[games, ghost]
+            self.cells[games, self.block_cell[blocks]] = old
+            self.cells[games, self.block_cell[targets]] = GHOST_CODE
+            self.ghost_old[games, ghost] = target_symbols
+            self.ghost_block[games, ghost] = targets
+            self.bigcoins[games] += (old == BIGCOIN_CODE).astype(np.int64) - (target_symbols == BIGCOIN_CODE)   # ghosts hide bigcoins
+
+            self.kill(games[targets == self.player_block[games]])
+
+    def respawn_coins(self):
+        due = self.respawns.pop(self.ticks, None)
+        if due is None:
+            return
+        games = np.concatenate([games for games, _ in due])
+        blocks = np.concatenate([blocks for _, blocks in due])
+        running = self.alive[games]
+        games, blocks = games[running], blocks[running]
+        cells = self.block_cell[blocks]
+        possible = (self.cells[games, cells] == EMPTY_CODE) & (self.player_block[games] != blocks)     # prevents afk coin farm
+        self.cells[games[possible], cells[possible]] = COIN_CODE
+        self.schedule_coins(games[~possible], blocks[~possible], seconds_to_ticks(max(COIN_RESPAWN_TIME, 1)))   # try again later
+
+    def tick(self):     # one fixed step of every game, same order as Game.tick()
+        self.ticks += 1
+        self.move_ghosts()
+
+        if self.ticks >= self.next_ghost_tick:
+            self.summon_ghosts()
+            self.next_ghost_tick = self.ticks + seconds_to_ticks(GHOST_SPAWN_INTERVAL[self.lvl])
+
+        due = np.flatnonzero(self.alive & (self.ticks >= self.next_bigcoin_tick))
+        if len(due):
+            self.summon_bigcoins(due[self.bigcoins[due] < BIGCOIN_SIMULTANEOUS_LIMIT])
+            self.next_bigcoin_tick[due] = self.next_bigcoin_delays(len(due))
+
+        self.respawn_coins()
+
+    def step(self, actions):    # player moves, then one tick; like the game loop with the input in between
+        self.move_players(np.asarray(actions))
+        self.tick()
+
+    def random_actions(self):      # any direction that isn't a wall, like simulate.random_policy()
+        blocks = self.player_block
+        choice = (self.random.random(self.games) * self.open_count[blocks]).astype(np.int64)
+        return self.open_directions[blocks, choice]
+
+    def run(self, policy="random", max_seconds=600):     # plays until every player is dead or max_seconds of game time
+        max_ticks = seconds_to_ticks(max_seconds)
+        while self.alive.any() and self.ticks < max_ticks:
+            if policy == "random":
+                self.step(self.random_actions())
+            else:
+                self.step(np.full(self.games, STAY))
+        self.death_tick[self.alive] = self.ticks
+
+    def results(self, policy="random"):     # one dict per game, same format as simulate.run_game()
+        return [{
+            "lvl": self.lvl,
+            "policy": policy,
+            "seed": None,
+            "score": int(self.coins[game]),
+            "survived": self.death_tick[game] * TICK_LENGTH,
+            "alive": bool(self.alive[game]),
+            "ghosts": int(self.ghost_active[game].sum()),
+            "ticks": int(self.death_tick[game]),
+        } for game in range(self.games)]
@@ -0,0 +1,181 @@
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import subprocess
+
+from constants import *
+from game import Game, Ghost
+from pathfinding import DIRECTIONS
+from simulate import load_maps
+from mazegen import generate_map
+
+# pathfinding benchmarks: latency percentiles and throughput, results as json so that two commits can be compared
+# usage: python benchmark.py --output results.json
+#        python benchmark.py --quick --compare results.json
+
+LOG = logging.getLogger("benchmark")
+
+GHOST_COUNTS = [1, 4, 16, 64]
+GENERATED_SIZES = [50, 100, 250, 500]
+QUICK_SIZES = [50, 100]
+
+
+def open_arena(width, height):      # walls only on the border, every block has many equally short ways
+    inner = "#" + COIN_SYMBOL * (width - 2) + "#"
+    return ["#" * width] + [inner] * (height - 2) + ["#" * width]
+
+def benchmark_maps(quick=False, sizes=None):    # (name, kind, rows)
+    maps = [(lvl, "bundled", map_data["data"]) for lvl, map_data in load_maps().items()]
+    for size in sizes or (QUICK_SIZES if quick else GENERATED_SIZES):
+        maps.append((f"arena_{size}x{size}", "arena", open_arena(size, size)))
+        maps.append((f"corridor_{size}x{size}", "corridor", generate_map(size, size, seed=0, loop_density=0)["data"]))     # perfect maze
+    return maps
+
+
+def percentile(samples, p):     # nearest rank, samples have to be sorted
+    index = max(0, min(len(samples) - 1, round(p / 100 * len(samples)) - 1))
+    return samples[index]
+
+def summarize_samples(samples, work=1):     # samples in sec, work: queries per sample for the throughput
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "samples": len(samples),
+        "mean_ms": total / len(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "throughput_per_s": len(samples) * work / total if total > 0 else None,
+    }
+
+def measure(function, budget, min_samples=5, max_samples=1000):    # runs function until the time budget (sec) is used up
+    samples = []
+    begin = time.perf_counter()
+    while len(samples) < max_samples and (len(samples) < min_samples or time.perf_counter() - begin < budget):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def walkable_blocks(game):
+    maze = game.maze
+    return [(x, y) for y in range(1, maze.height + 1) for x in range(1, maze.width + 1) if maze.get(x, y) != WALL_SYMBOL]
+
+def make_game(rows, seed):      # a game without the start ghosts, the benchmark places its own
+    game = Game(rows, "easy", "random", seed=seed)
+    for ghost in game.ghosts.values():
+        game.update_block(ghost.x, ghost.y, ghost.old_symbol)
+    game.ghosts.clear()
+    return game
+
+def bench_find_shortest_way(game, budget, rng):     # one search between two random blocks
+    blocks = walkable_blocks(game)
+    pairs = iter(lambda: (rng.choice(blocks), rng.choice(blocks)), None)
+
+    def query():
+        start, end = next(pairs)
+        game.find_shortest_way(game.player, start, end)
+    return summarize_samples(measure(query, budget))
+
+def bench_ghosts(game, ghost_count, budget, rng):      # one round: the player moves, then every ghost picks its next step
+    blocks = walkable_blocks(game)
+    player = game.player
+    for ghost_id in range(ghost_count):
+        x, y = rng.choice(blocks)
+        Ghost(game, ghost_id, x, y, player, EMPTY_SYMBOL)     # not written into the maze, they only ask for their way
+
+    def ghost_round():
+        options = [(dx, dy) for dx, dy in DIRECTIONS if game.check_collision(player, dx, dy)[0]]
+        if options:
+            dx, dy = rng.choice(options)
+            player.move(dx, dy)
+        for ghost in game.ghosts.values():
+            ghost.get_next_step()
+    return summarize_samples(measure(ghost_round, budget), ghost_count)
+
+def run(maps, ghost_counts, budget, seed=0):
+    results = []
+    for name, kind, rows in maps:
+        LOG.info(f"benchmarking {name}")
+        game = make_game(rows, seed)
+        base = {
+            "map": name,
+            "kind": kind,
+            "width": game.maze.width,
+            "height": game.maze.height,
+            "blocks": sum(game.maze.walkable()),
+            "path_table": game.path_table is not None,
+        }
+        results.append(dict(base, bench="find_shortest_way", ghosts=None, **bench_find_shortest_way(game, budget, random.Random(seed))))
+        for ghost_count in ghost_counts:
+            game = make_game(rows, seed)
+            results.append(dict(base, bench="ghost_round", ghosts=ghost_count, **bench_ghosts(game, ghost_count, budget, random.Random(seed))))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def metadata(budget):
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "budget_s": budget,
+    }
+
+def result_key(result):
+    return (result["map"], result["bench"], result["ghosts"])
+
+def compare(results, baseline):     # change of p50 and p99 against an earlier run, negative is faster
+    old = {result_key(result): result for result in baseline["results"]}
+    for result in results:
+        before = old.get(result_key(result))
+        if before is None:
+            continue
+        p50 = (result["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0
+        p99 = (result["p99_ms"] / before["p99_ms"] - 1) * 100 if before["p99_ms"] else 0
+        ghosts = f"{result['ghosts']} ghosts" if result["ghosts"] else ""
+        print(f"{result['map']:18} {result['bench']:18} {ghosts:10} p50 {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms ({p50:+6.1f}%)  "
+              f"p99 {before['p99_ms']:9.3f} -> {result['p99_ms']:9.3f} ms ({p99:+6.1f}%)")
+
+def print_results(results):
+    for result in results:
+        ghosts = f"{result['ghosts']} ghosts" if result["ghosts"] else ""
+        print(f"{result['map']:18} {result['bench']:18} {ghosts:10} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+              f"p99 {result['p99_ms']:9.3f} ms  {result['throughput_per_s']:12.1f}/s  ({result['samples']} samples)")
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="pathfinding benchmarks")
+    parser.add_argument("--quick", action="store_true", help="only the small generated maps")
+    parser.add_argument("--size", type=int, action="append", help="size of the generated maps, can be given multiple times")
+    parser.add_argument("--ghosts", type=int, action="append", help="ghost counts, default: 1 4 16 64")
+    parser.add_argument("--budget", type=float, default=1.0, help="time per benchmark in sec (at least 5 samples)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--compare", help="json file of an earlier run")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+    LOG.setLevel(logging.INFO)
+
+    results = run(benchmark_maps(args.quick, args.size), args.ghosts or GHOST_COUNTS, args.budget, args.seed)
+    document = {"meta": metadata(args.budget), "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=4)
+    print_results(results)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            print(f"\ncompared with {args.compare}:")
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 
 CONFIG_FILE = "./config.json"
+JOURNAL_FILE = "./journal.bin"  # changes of the running game since its last snapshot, see journal.py
 
 BLACK = (0, 0, 0)
 YELLOW = (255, 255, 0)
@@ -32,3 +33,15 @@ BIGCOIN_SYMBOL = "*"
 GHOST_SYMBOL = "!"
 
 AUTO_SAVE_INTERVAL = 1  # in sec
+JOURNAL_SNAPSHOT_INTERVAL = 60   # in sec of game time; the config is also only saved this often, the journal covers everything in between
+JOURNAL_MAX_SIZE = 256 * 1024    # in bytes, a bigger journal is compacted before the interval is over
+
+PATH_TABLE_CACHE_DIR = "./.cache/path_tables"
+PATH_TABLE_MAX_BLOCKS = 2048    # walkable blocks; the table needs blocks^2 * 2 bytes, bigger maps use the distance field instead
+
+TICK_LENGTH = 0.05  # in sec; the game (ghosts, cooldowns, spawns, respawns) advances in fixed steps of this length
+GHOST_START_COUNT = {"easy": 2, "medium": 3, "hard": 4}
+GHOST_SPAWN_INTERVAL = {"easy": 60, "medium": 45, "hard": 30}  # in sec
+GHOST_SPAWN_MIN_DISTANCE = 8   # in steps the player would need to reach the ghost, closer blocks are only used if there is no other
+
+TARGET_FPS = 60     # input polling rate of the game, menus only wake up on input
@@ -0,0 +1,118 @@
+import numpy as np
+
+from constants import *
+from game import Game, seconds_to_ticks
+from batch import BatchGame, STAY as BATCH_STAY
+from maze import WALL_CODE, COIN_CODE, BIGCOIN_CODE, GHOST_CODE
+from pathfinding import DIRECTIONS
+from simulate import load_maps
+
+# gym style environments for training player bots against the real ghost ai, no window and no sleeps
+# one step is one decision of the player: the move (if possible) and then the game runs until the player can move again
+# actions: 0-3 direction codes (O, W, S, N), 4 stays on the block
+# observation: uint8 planes (walls, coins, bigcoins, ghosts, player) of the maze size
+# reward: coins collected during the step, done: player was killed (or max_steps reached)
+
+STAY = 4
+ACTION_COUNT = 5
+PLANES = (WALL_CODE, COIN_CODE, BIGCOIN_CODE, GHOST_CODE)   # the player plane comes last
+STEP_TICKS = seconds_to_ticks(0.5)     # player move cooldown, a step without a move takes as long as one with
+
+
+def observe(cells, player_cells, shape):      # cells: (games, height * width) codes, player_cells: (games,) cell index
+    games = len(cells)
+    planes = np.zeros((games, len(PLANES) + 1, shape[0] * shape[1]), dtype=np.uint8)
+    for plane, code in enumerate(PLANES):
+        planes[:, plane] = cells == code
+    planes[np.arange(games), len(PLANES), player_cells] = 1
+    return planes.reshape(games, len(PLANES) + 1, shape[0], shape[1])
+
+
+class PacmanEnv:
+    def __init__(self, level="easy", maps=None, max_steps=None):
+        self.maps = maps if maps is not None else load_maps()
+        self.level = level
+        self.max_steps = max_steps      # None: until the player is killed
+        self.game = None
+        self.steps = 0
+
+    @property
+    def observation_shape(self):
+        data = self.maps[self.level]["data"]
+        return (len(PLANES) + 1, len(data), len(data[0]))
+
+    def observation(self):
+        maze = self.game.maze
+        cells = np.frombuffer(bytes(maze.cells), dtype=np.uint8)[None, :]
+        player_cell = maze.index(self.game.player.x, self.game.player.y)
+        return observe(cells, np.array([player_cell]), (maze.height, maze.width))[0]
+
+    def reset(self, seed=None, level=None):
+        if level is not None:
+            self.level = level
+        map_data = self.maps[self.level]
+        self.game = Game(map_data["data"], self.level, map_data["spawn"], seed=seed)
+        self.steps = 0
+        return self.observation()
+
+    def step(self, action):
+        game = self.game
+        player = game.player
+        coins = player.coins
+        if action != STAY and game.running and player.can_move:
+            game.move_player(*DIRECTIONS[action])      # walls just block the move
+        for _ in range(STEP_TICKS):
+            if not game.running:
+                break
+            game.tick()
+
+        self.steps += 1
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        done = not player.is_alive or truncated
+        info = {"score": player.coins, "ticks": game.ticks, "truncated": truncated and player.is_alive}
+        return self.observation(), player.coins - coins, done, info
+
+
+# many environments of one level stepped together on the batch engine
+# a finished game stays finished (done, reward 0) until the next reset(), every game resets at once
+class VectorPacmanEnv:
+    def __init__(self, games, level="easy", maps=None, max_steps=None):
+        self.maps = maps if maps is not None else load_maps()
+        self.games = games
+        self.level = level
+        self.max_steps = max_steps
+        self.batch = None
+        self.steps = 0
+
+    @property
+    def observation_shape(self):
+        data = self.maps[self.level]["data"]
+        return (self.games, len(PLANES) + 1, len(data), len(data[0]))
+
+    def observation(self):
+        batch = self.batch
+        return observe(batch.cells, batch.block_cell[batch.player_block], (batch.height, batch.width))
+
+    def reset(self, seed=None, level=None):
+        if level is not None:
+            self.level = level
+        map_data = self.maps[self.level]
+        self.batch = BatchGame(map_data["data"], self.level, self.games, map_data["spawn"], seed)
+        self.steps = 0
+        return self.observation()
+
+    def step(self, actions):
+        batch = self.batch
+        actions = np.asarray(actions)
+        coins = batch.coins.copy()
+        batch.move_players(np.where(actions == STAY, BATCH_STAY, actions))
+        for _ in range(STEP_TICKS):
+            if not batch.alive.any():
+                break
+            batch.tick()
+
+        self.steps += 1
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        dones = ~batch.alive | truncated
+        info = {"score": batch.coins.copy(), "ticks": batch.ticks, "truncated": truncated}
+        return self.observation(), batch.coins - coins, dones, info
@@ -0,0 +1,16 @@
+import os
+
+# files that are replaced as a whole (config, journal snapshots, path tables): the new content is written next to the old file
+# and then swapped in, so a crash or power loss never leaves a half written file behind
+
+
+def replace_file(path, write, mode="wb"):     # write(f) fills the new file
+    tmp_path = f"{path}.{os.getpid()}.tmp"     # own file per process, parallel runs may write the same file
+    try:
+        with open(tmp_path, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,527 @@
+import random
+import logging
+from collections import Counter
+
+from constants import *
+from pathfinding import shortest_way as shortest_way_on_maze
+from pathfinding import DistanceField, load_path_table
+from maze import MazeGrid
+from scheduler import RespawnScheduler
+
+# game logic without any display, main.py only adds the window, input and config on top of it
+# importing this module has no side effects, so it can be used for headless runs
+
+LOG = logging.getLogger("main")
+PATHFINDING_LOG = logging.getLogger("pathfinding")
+COIN_LOG = logging.getLogger("coin")
+MAP_LOG = logging.getLogger("map")
+
+
+def seconds_to_ticks(seconds):
+    return round(seconds / TICK_LENGTH)
+
+
+class Renderer:     # shows the game somewhere, this one shows nothing (headless); only called from whoever runs tick()
+    def mark_dirty(self, x_block, y_block):     # something visible changed on that block
+        pass
+
+    def block_changed(self, x_block, y_block, updated_block):     # maze write
+        self.mark_dirty(x_block, y_block)
+
+    def update(self):       # a batch of changes is done, draw when possible
+        pass
+
+
+class Journal:      # records every change of the game state so it can be restored, this one records nothing
+    def block(self, x_block, y_block, updated_block):     # maze write
+        pass
+
+    def player(self, player):       # position, coins or alive changed
+        pass
+
+    def respawn(self, key, entity, pos, deadline):      # respawn scheduled or retried, deadline None: respawned
+        pass
+
+    def ghost(self, ghost):     # summoned or stepped, with the symbol it is standing on and its next move
+        pass
+
+    def timers(self, next_ghost_time, next_bigcoin_time):      # next ghost and bigcoin spawn in game time
+        pass
+
+
+class Player:
+    def __init__(self, game, x, y, coins=0):
+        self.game = game
+        self.x = x
+        self.y = y
+        self.speed = 1  # in blocks; int only; do not change unless map was designed to support different speed
+        self.move_cooldown = 0.5   # in sec
+        self.can_move = True
+        self.move_ready_tick = 0    # game tick at which the cooldown is over
+        self.is_alive = True
+        self.coins = coins
+
+        LOG.debug(f"player spawn: {self.x} {self.y}")
+
+        spawn_block = game.get_block(x, y)
+        if spawn_block == COIN_SYMBOL:      # if player spawns on coin
+            game.update_block(x, y, EMPTY_SYMBOL)
+            self.add_coins(COIN_VALUE)
+            game.collected[COIN_SYMBOL] += 1
+            game.respawn_scheduler.schedule(COIN_SYMBOL, (x, y), COIN_RESPAWN_TIME)
+
+    def move(self, dx, dy):
+        self.x += dx * self.speed
+        self.y += dy * self.speed
+        LOG.debug(f"player move: {self.x} {self.y}")
+
+    def future_pos(self, dx, dy, x=None, y=None):
+        if x is None:
+            x = self.x
+        if y is None:
+            y = self.y
+        x = (dx * self.speed) + x
+        y = (dy * self.speed) + y
+        return x, y
+
+    def add_coins(self, coins=1):
+        self.coins += coins
+
+    def kill(self):
+        LOG.info("Player killed")
+        self.is_alive = False
+        self.game.renderer.mark_dirty(self.x, self.y)      # removes the player from screen
+        self.game.game_over()
+
+class Ghost:
+    def __init__(self, game, id, x, y, player, old_symbol):
+        self.game = game
+        self.id = id
+        self.x = x
+        self.y = y
+        self.speed = 1      # in blocks; int only; do not change unless map was designed to support different speed
+        self.cooldown = 0.5       # in sec
+        self.player = player
+        self.spawn_lock_time = 5    # in sec (int); >= 1
+        self.old_symbol = old_symbol
+        self.next_move_tick = game.ticks + seconds_to_ticks(self.spawn_lock_time)
+
+        game.ghosts[id] = self
+        game.under_ghosts[old_symbol] += 1
+
+        LOG.debug(f"ghost spawn: {self.x} {self.y}")
+
+    def future_pos(self, dx, dy, x=None, y=None): # can use a custom starting point
+        if x is None:
+            x = self.x
+        if y is None:
+            y = self.y
+        x = (dx * self.speed) + x
+        y = (dy * self.speed) + y
+        return x, y
+
+    def auto_move(self):
+        LOG.debug(f"ghost{self.id} calculating next step")
+        next_step = self.get_next_step()
+        LOG.debug(f"ghost{self.id} next step (direction): {next_step}")
+
+        if next_step is not False:  # not using "if next_step != False" here since it will trigger when having 0
+            dx, dy = 0, 0
+            if next_step == 0:     # O
+                dx = 1 * self.speed
+            elif next_step == 1:   # W
+                dx = -1 * self.speed
+            elif next_step == 2:   # S
+                dy = 1 * self.speed
+            elif next_step == 3:   # N
+                dy = -1 * self.speed
+
+            return self.move(dx, dy)
+        return False
+
+    def move(self, dx, dy):
+
+        future_pos = self.future_pos(dx, dy)
+        old_symbol = self.game.get_block(future_pos[0], future_pos[1])
+
+        if old_symbol == GHOST_SYMBOL:      # if there was another ghost it needs to wait so that it can detect the static entity on the block
+            return False
+
+        self.x += dx * self.speed
+        self.y += dy * self.speed
+
+        LOG.debug(f"ghost{self.id} move: {self.x} {self.y}")
+
+        if self.x == self.player.x and self.y == self.player.y:
+            self.player.kill()
+
+        return old_symbol
+
+    def get_next_step(self):      # same choice as find_shortest_way() but without searching per ghost
+        game = self.game
+        randomize = game.lvl == "hard"
+        if game.path_table is not None and game.path_table.valid:
+            return game.path_table.next_step((self.x, self.y), (self.player.x, self.player.y), randomize, game.random)
+        game.player_distances.set_target((self.player.x, self.player.y))    # only searches once per player move, the other ghosts reuse it
+        return game.player_distances.next_step((self.x, self.y), randomize, game.random)
+
+
+# all state of one game, replaces the module globals that start_game() used to reset
+# nothing here sleeps: tick() advances the game by TICK_LENGTH, whoever calls it decides how fast time passes
+class Game:
+    def __init__(self, rows, lvl, spawn="random", coins=0, pending_respawns=None, continued_game=False,
+                 renderer=None, on_game_over=None, seed=None, path_table_cache=PATH_TABLE_CACHE_DIR, journal=None, saved_ghosts=None,
+                 timers=None):
+        self.lvl = lvl
+        self.renderer = renderer if renderer is not None else Renderer()
+        self.journal = journal if journal is not None else Journal()
+        self.on_game_over = on_game_over    # called with the player once it was killed
+        self.random = random.Random(seed)   # every random choice of this game, same seed: same game (for the same inputs)
+        self.running = True
+
+        self.maze = MazeGrid(rows)
+        self.ghosts = {}
+        self.under_ghosts = Counter()    # symbol: how many ghosts stand on it, the maze only shows the ghost
+        self.collected = Counter()       # symbol: how many the player collected in this game
+        self.ticks = 0              # game time in ticks of TICK_LENGTH, only advanced by tick()
+        self.requested_move = None  # (dx, dy) from the input thread, applied by the next tick()
+        self.respawn_scheduler = RespawnScheduler(self.regenerate_item, self.time, self.journal.respawn)     # owns all pending item respawns, also used for saving them
+        self.path_table = load_path_table(self.maze, path_table_cache)     # precompiled distances of the map, None if the map is too big
+        self.player_distances = DistanceField(self.maze)    # shared distance field towards the player, read by all ghosts
+
+        if spawn == "random":
+            spawn = self.get_random_spawn_block([EMPTY_SYMBOL, COIN_SYMBOL])
+        self.player = Player(self, spawn[0], spawn[1], coins)
+        if pending_respawns:
+            self.load_pending_respawns(pending_respawns)
+
+        if continued_game:
+            self.summon_saved_ghosts(saved_ghosts)
+        else:
+            self.summon_start_ghosts()
+
+        if timers:      # continued game: the countdowns go on, stopping the game doesn't reset them
+            self.next_ghost_tick = seconds_to_ticks(timers["ghost_spawn"])
+            self.next_bigcoin_tick = seconds_to_ticks(timers["bigcoin_spawn"])
+        else:
+            self.next_ghost_tick = seconds_to_ticks(GHOST_SPAWN_INTERVAL[lvl])
+            self.next_bigcoin_tick = self.next_bigcoin_delay()
+
+    @classmethod
+    def from_config(cls, c, new_game, **kwargs):      # new or continued game from the parsed config.json
+        current_play = c["userdata"]["current_play"]
+        if current_play["is_alive"] and not new_game:   # continue game
+            return cls(current_play["maze"], current_play["lvl"], current_play["position"], current_play["score"],
+                       current_play["pending_respawns"], continued_game=True, saved_ghosts=current_play.get("ghosts"),
+                       timers=current_play.get("timers"), **kwargs)
+
+        lvl = c["userdata"]["settings"]["difficulty_set"]
+        spawn_data = c["maps"][lvl]["spawn"]
+        return cls(c["maps"][lvl]["data"], lvl, spawn_data, **kwargs)     # spawn is a [x, y] list or "random"
+
+    def time(self):     # in sec, used as clock for respawns
+        return self.ticks * TICK_LENGTH
+
+    def current_play(self):     # same format as userdata.current_play in the config
+        return {
+            "is_alive": self.player.is_alive,
+            "score": self.player.coins,
+            "position": [self.player.x, self.player.y],
+            "maze": self.maze.rows(),     # config keeps the readable list of strings
+            "pending_respawns": self.respawn_scheduler.pending(),    # remaining time, so that on continued game the timer won't reset
+            "lvl": self.lvl,
+            "ghosts": [[ghost.x, ghost.y, ghost.old_symbol, self.remaining_time(ghost.next_move_tick)]    # the maze only shows the ghosts, not what they stand on
+                       for ghost in list(self.ghosts.values())],
+            "timers": {"ghost_spawn": self.remaining_time(self.next_ghost_tick), "bigcoin_spawn": self.remaining_time(self.next_bigcoin_tick)},
+        }
+
+    def remaining_time(self, tick):     # in sec, for saving countdowns
+        return max(0, tick - self.ticks) * TICK_LENGTH
+
+    def play_version(self):     # changes with everything current_play() contains except the respawn countdowns, cheap to compare
+        player = self.player
+        scheduler = self.respawn_scheduler
+        return (self.maze.version, player.is_alive, player.coins, player.x, player.y, scheduler.next_key, len(scheduler.items))
+
+    def stop(self):
+        self.running = False
+
+    def game_over(self):
+        self.journal.player(self.player)
+        if self.on_game_over is not None:
+            self.on_game_over(self.player)
+        self.renderer.update()
+        self.running = False
+
+    # maze access, every write goes through here so that everything derived from the maze stays up to date
+
+    def log_maze(self):
+        if MAP_LOG.level == logging.DEBUG:  # may cause lag otherwise
+            maze_str = '\n'.join(self.maze.rows())
+            MAP_LOG.debug(f"updated maze:\n{maze_str}\n")
+
+    def block_changed(self, x_block, y_block, updated_block):
+        self.renderer.block_changed(x_block, y_block, updated_block)
+        self.journal.block(x_block, y_block, updated_block)
+        self.player_distances.set_block((x_block, y_block), updated_block)    # repairs the distance field if a wall was placed or removed
+        if self.path_table is not None:
+            self.path_table.set_block((x_block, y_block), updated_block)
+
+    # writes are applied right away (the maze locks itself), so readers never have to wait for a writer thread
+    def update_block(self, x_block, y_block, updated_block):
+        self.maze.set(x_block, y_block, updated_block)
+        self.block_changed(x_block, y_block, updated_block)
+        self.log_maze()
+        self.renderer.update()
+
+    def swap_block(self, x_block, y_block, updated_block, x_block2, y_block2, updated_block2):
+        self.maze.swap(x_block, y_block, updated_block, x_block2, y_block2, updated_block2)
+        self.block_changed(x_block, y_block, updated_block)
+        self.block_changed(x_block2, y_block2, updated_block2)
+        self.log_maze()
+        self.renderer.update()
+
+    def replace_block(self, x_block, y_block, old_block, updated_block):     # update_block() that only happens if old_block is still there
+        if not self.maze.replace(x_block, y_block, old_block, updated_block):
+            return False
+        self.block_changed(x_block, y_block, updated_block)
+        self.log_maze()
+        self.renderer.update()
+        return True
+
+    def get_block(self, x_block, y_block):
+        return self.maze.get(x_block, y_block)
+
+    def count_symbol(self, symbol):     # visible blocks, O(1)
+        return self.maze.count(symbol)
+
+    def symbol_counts(self):
+        return self.maze.counts()
+
+    def remaining(self, symbol):     # still in the maze, including the items ghosts are standing on
+        return self.maze.count(symbol) + self.under_ghosts[symbol]
+
+    def remaining_coins(self):
+        return self.remaining(COIN_SYMBOL)
+
+    def remaining_value(self):      # coins the player could still collect right now
+        return self.remaining(COIN_SYMBOL) * COIN_VALUE + self.remaining(BIGCOIN_SYMBOL) * BIGCOIN_VALUE
+
+    def check_collision(self, entity, dx, dy, x=None, y=None):        # reworked to check based on block from maze list instead of pixel color
+        future_pos = entity.future_pos(dx, dy, x, y)
+        try:
+            entity_on_block = self.maze.get(future_pos[0], future_pos[1])
+        except IndexError:
+            return (False, False)
+
+        if entity_on_block == WALL_SYMBOL:
+            return (False, False)
+        elif entity_on_block == EMPTY_SYMBOL:
+            return (True, False)
+
+        return (True, entity_on_block)
+
+    def find_shortest_way(self, entity, starting_pos, ending_pos):     # entity is kept for compatibility, every entity moves one block per step
+
+        randomize = self.lvl == "hard"       # easy/medium: always use first way in direction order; hard: random choice on equally short ways
+        if self.path_table is not None and self.path_table.valid:
+            shortest_way = self.path_table.shortest_way(starting_pos, ending_pos, randomize, self.random)
+        else:
+            shortest_way = shortest_way_on_maze(self.maze, starting_pos, ending_pos, randomize, self.random)
+
+        if shortest_way:
+            PATHFINDING_LOG.debug("required steps: " + str(len(shortest_way)))
+            PATHFINDING_LOG.debug("directions: " + str(shortest_way))
+
+        return shortest_way
+
+    def get_random_spawn_block(self, allowed_blocks, player = None):     # drawn from the maze's symbol index, no scan of the maze
+        exclude = None
+        if player != None:      # not in the row or column of the player
+            exclude = lambda pos: pos[0] == player.x or pos[1] == player.y
+
+        block = self.maze.random_block(allowed_blocks, self.random, exclude)
+        if block is not None:
+            return block
+        LOG.debug("no empty block was found")
+        return False
+
+    # player
+
+    def request_move(self, dx, dy):     # for other threads than the one calling tick(), the last request before the tick wins
+        if dx != 0 or dy != 0:
+            self.requested_move = (dx, dy)
+
+    def move_player(self, dx, dy):      # returns True if the player moved, the cooldown is lifted by tick(); same thread as tick() only
+        if dx == 0 and dy == 0:
+            return False
+
+        player = self.player
+        allowed, entity = self.check_collision(player, dx, dy)
+        if not allowed:
+            return False
+
+        self.renderer.mark_dirty(player.x, player.y)
+        player.move(dx, dy)
+        self.renderer.mark_dirty(player.x, player.y)
+        if entity:
+            self.entity_collision_handler(player, entity)
+        self.journal.player(player)
+
+        self.renderer.update()
+        player.can_move = False
+        player.move_ready_tick = self.ticks + seconds_to_ticks(player.move_cooldown)
+        return True
+
+    def entity_collision_handler(self, player, entity):
+        if entity == COIN_SYMBOL:
+
+            pos_x, pos_y = player.x, player.y
+            self.update_block(pos_x, pos_y, EMPTY_SYMBOL)
+
+            player.add_coins(COIN_VALUE)
+            self.collected[entity] += 1
+            COIN_LOG.debug(f"collected coin at {pos_x},{pos_y}")
+
+            self.respawn_scheduler.schedule(entity, (pos_x, pos_y), COIN_RESPAWN_TIME)
+
+        elif entity == BIGCOIN_SYMBOL:
+            pos_x, pos_y = player.x, player.y
+            self.update_block(pos_x, pos_y, EMPTY_SYMBOL)
+
+            player.add_coins(BIGCOIN_VALUE)
+            self.collected[entity] += 1
+            COIN_LOG.debug(f"collected bigcoin at {pos_x},{pos_y}")
+
+        elif entity == GHOST_SYMBOL:
+            player.kill()
+
+    # ghosts and items
+
+    def get_next_ghost_id(self):
+        return len(self.ghosts)
+
+    def summon_ghost(self, target_player, spawn=False, under_symbol=EMPTY_SYMBOL):
+        ghost_id = self.get_next_ghost_id()
+        LOG.info(f"spawning ghost{ghost_id}")
+        if not spawn:
+            spawn = self.get_ghost_spawn_block(target_player)
+        if spawn != False:
+
+            old_symbol = self.get_block(spawn[0], spawn[1])
+            if not old_symbol == GHOST_SYMBOL:
+                self.update_block(spawn[0], spawn[1], GHOST_SYMBOL)
+            else:   # means ghost exists already (continued game), the save knows what it was standing on
+                old_symbol = under_symbol
+
+            ghost = Ghost(self, ghost_id, spawn[0], spawn[1], target_player, old_symbol)     # moved by tick()
+            self.journal.ghost(ghost)
+            return ghost
+
+    def get_ghost_spawn_block(self, player):    # a free block the player can't reach in less than GHOST_SPAWN_MIN_DISTANCE steps
+        allowed = (EMPTY_SYMBOL, COIN_SYMBOL)
+        distances = self.player_distances
+        distances.set_target((player.x, player.y))     # no search if the ghosts already follow the player with it
+        spawn = distances.random_block(GHOST_SPAWN_MIN_DISTANCE, self.random, lambda pos: self.get_block(pos[0], pos[1]) in allowed)
+        if spawn is not None:
+            return spawn
+        LOG.debug("no block far enough from the player, spawning anywhere")     # small maps
+        return self.get_random_spawn_block(list(allowed), player)
+
+    def summon_start_ghosts(self):
+        for i in range(GHOST_START_COUNT[self.lvl]):
+            self.summon_ghost(self.player)
+
+    def summon_saved_ghosts(self, saved_ghosts=None):      # continued game: the saved maze still contains the ghosts
+        saved = {(entry[0], entry[1]): entry[2:] for entry in saved_ghosts or ()}     # [symbol below, sec until the next move]
+        for y in range(1, self.maze.height + 1):
+            for x in range(1, self.maze.width + 1):
+                if self.get_block(x, y) == GHOST_SYMBOL:
+                    entry = saved.get((x, y), [EMPTY_SYMBOL])     # older saves don't have them, the ghosts then stand on empty blocks
+                    ghost = self.summon_ghost(self.player, (x, y), entry[0])
+                    if len(entry) > 1:      # otherwise the spawn lock starts again
+                        ghost.next_move_tick = self.ticks + seconds_to_ticks(entry[1])
+
+    def summon_bigcoin(self, player):
+        random_block = self.get_random_spawn_block([EMPTY_SYMBOL, COIN_SYMBOL], player)
+        if random_block == False:
+            return
+        symbol = self.get_block(random_block[0], random_block[1])
+
+        self.update_block(random_block[0], random_block[1], BIGCOIN_SYMBOL)
+
+        if symbol == COIN_SYMBOL:   # make sure the normal coin respawns again
+
+            self.respawn_scheduler.schedule(COIN_SYMBOL, (random_block[0], random_block[1]), COIN_RESPAWN_TIME)
+
+    def next_bigcoin_delay(self):
+        return seconds_to_ticks(self.random.randint(BIGCOIN_SUMMON_MIN, BIGCOIN_SUMMON_MAX))
+
+    def regenerate_item(self, entity, pos):      # called by respawn_scheduler once the time is over, False: try again later
+        if self.player.x != pos[0] or self.player.y != pos[1]:        # prevents afk coin farm
+            if self.replace_block(pos[0], pos[1], EMPTY_SYMBOL, entity):   # prevents to spawn multiple entities on single block
+                if entity == COIN_SYMBOL:
+                    COIN_LOG.debug(f"respawned coin at {pos[0]},{pos[1]}")
+                return True
+        COIN_LOG.debug(f"coin at {pos[0]},{pos[1]} couldn't respawn")
+        return False
+
+    def load_pending_respawns(self, last_pending_respawns):
+        for key, value in last_pending_respawns.items():
+            self.respawn_scheduler.schedule(value[0], value[1], value[2])
+
+    # game time
+
+    def ghost_step(self, ghost):
+        old_x, old_y = ghost.x, ghost.y
+        current_symbol = ghost.auto_move()
+
+        if ghost.old_symbol != None:
+            if current_symbol != False:
+                self.swap_block(ghost.x, ghost.y, GHOST_SYMBOL, old_x, old_y, ghost.old_symbol)
+                self.under_ghosts[ghost.old_symbol] -= 1
+                self.under_ghosts[current_symbol] += 1
+                ghost.old_symbol = current_symbol
+        else:
+            LOG.error(f"old_symbol not found: {ghost.old_symbol}")
+
+    # one fixed step of the whole game: player cooldown, ghosts, ghost and bigcoin generation, respawns
+    # ghosts move every ghost.cooldown of game time no matter how long the calculation took
+    def tick(self):
+        self.ticks += 1
+        player = self.player
+
+        if not player.can_move and self.ticks >= player.move_ready_tick:
+            player.can_move = True
+
+        move = self.requested_move
+        if move is not None:
+            self.requested_move = None
+            if player.can_move and player.is_alive:     # requests during the cooldown are dropped
+                self.move_player(*move)
+                if not self.running:    # walked into a ghost
+                    return
+
+        for ghost in list(self.ghosts.values()):     # ghosts can be summoned during the tick
+            if not self.running:
+                return
+            if self.ticks >= ghost.next_move_tick:
+                self.ghost_step(ghost)
+                ghost.next_move_tick = self.ticks + seconds_to_ticks(ghost.cooldown)
+                self.journal.ghost(ghost)
+
+        timers_changed = False
+        if self.ticks >= self.next_ghost_tick:
+            self.summon_ghost(player)
+            self.next_ghost_tick = self.ticks + seconds_to_ticks(GHOST_SPAWN_INTERVAL[self.lvl])
+            timers_changed = True
+
+        if self.ticks >= self.next_bigcoin_tick:
+            if self.count_symbol(BIGCOIN_SYMBOL) < BIGCOIN_SIMULTANEOUS_LIMIT:
+                self.summon_bigcoin(player)
+            self.next_bigcoin_tick = self.ticks + self.next_bigcoin_delay()
+            timers_changed = True
+        if timers_changed:
+            self.journal.timers(self.next_ghost_tick * TICK_LENGTH, self.next_bigcoin_tick * TICK_LENGTH)
+
+        self.respawn_scheduler.run_due(self.time())
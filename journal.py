@@ -0,0 +1,174 @@
+import struct
+import logging
+import threading
+
+from constants import *
+from game import Journal
+from files import replace_file
+
+# append-only binary journal of the running game, written next to the config: a snapshot of the whole game, then every change
+# the autosave only appends the few changes of the last second instead of rewriting the config, compact() starts over with a new snapshot
+# every record sets a value (block, player, respawn, ghost, timers), replaying one twice gives the same state; a record cut off by a crash is ignored
+# file: header, maze cells, then records of one type byte and their fields
+
+LOG = logging.getLogger("main")
+
+JOURNAL_HEADER = struct.Struct("<4sHH8s")     # magic, width, height, lvl
+JOURNAL_MAGIC = b"PJL2"
+
+BLOCK, PLAYER, TIME, RESPAWN, RESPAWNED, GHOST, TIMERS = range(7)
+RECORDS = {
+    BLOCK: struct.Struct("<BIB"),           # type, cell index, symbol
+    PLAYER: struct.Struct("<BHHI?"),        # type, x, y, coins, is alive
+    TIME: struct.Struct("<Bd"),             # type, game time in sec
+    RESPAWN: struct.Struct("<BIBHHd"),      # type, key, symbol, x, y, deadline in game time
+    RESPAWNED: struct.Struct("<BI"),        # type, key
+    GHOST: struct.Struct("<BHHHBd"),        # type, ghost id, x, y, symbol the ghost is standing on, next move in game time
+    TIMERS: struct.Struct("<Bdd"),          # type, next ghost spawn, next bigcoin spawn in game time
+}
+
+
+class GameJournal(Journal):     # called from the game loop, written by the autosave thread
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.buffer = bytearray()   # records since the last flush()
+        self.file = None
+        self.width = None           # known once the first snapshot was taken, earlier changes are part of it anyway
+        self.size = 0               # bytes in the file
+        self.snapshot_time = 0      # game time of the last snapshot
+
+    def record(self, kind, *values):
+        with self.lock:
+            if self.width is not None:
+                self.buffer += RECORDS[kind].pack(kind, *values)
+
+    def block(self, x_block, y_block, updated_block):
+        if self.width is not None:
+            self.record(BLOCK, (y_block - 1) * self.width + (x_block - 1), ord(updated_block))
+
+    def player(self, player):
+        self.record(PLAYER, player.x, player.y, player.coins, player.is_alive)
+
+    def respawn(self, key, entity, pos, deadline):
+        if deadline is None:
+            self.record(RESPAWNED, key)
+        else:
+            self.record(RESPAWN, key, ord(entity), pos[0], pos[1], deadline)
+
+    def ghost(self, ghost):
+        self.record(GHOST, ghost.id, ghost.x, ghost.y, ord(ghost.old_symbol), ghost.next_move_tick * TICK_LENGTH)
+
+    def timers(self, next_ghost_time, next_bigcoin_time):
+        self.record(TIMERS, next_ghost_time, next_bigcoin_time)
+
+    def flush(self, time):      # appends the changes, the time keeps the respawn countdowns exact
+        with self.lock:
+            if self.file is None:
+                return
+            self.buffer += RECORDS[TIME].pack(TIME, time)
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def needs_compaction(self, time):
+        return self.size > JOURNAL_MAX_SIZE or time - self.snapshot_time >= JOURNAL_SNAPSHOT_INTERVAL
+
+    def snapshot(self, game):
+        maze = game.maze
+        player = game.player
+        time = game.time()
+        with maze.lock:
+            cells = bytes(maze.cells)
+        data = bytearray(JOURNAL_HEADER.pack(JOURNAL_MAGIC, maze.width, maze.height, game.lvl.encode("ascii")))
+        data += cells
+        data += RECORDS[PLAYER].pack(PLAYER, player.x, player.y, player.coins, player.is_alive)
+        data += RECORDS[TIME].pack(TIME, time)
+        for key, (entity, pos, deadline) in game.respawn_scheduler.deadlines().items():
+            data += RECORDS[RESPAWN].pack(RESPAWN, key, ord(entity), pos[0], pos[1], deadline)
+        for ghost in list(game.ghosts.values()):
+            data += RECORDS[GHOST].pack(GHOST, ghost.id, ghost.x, ghost.y, ord(ghost.old_symbol), ghost.next_move_tick * TICK_LENGTH)
+        data += RECORDS[TIMERS].pack(TIMERS, game.next_ghost_tick * TICK_LENGTH, game.next_bigcoin_tick * TICK_LENGTH)
+        return data, time
+
+    def compact(self, game):    # replaces the journal with a snapshot of the game, also starts it
+        with self.lock:     # changes made while the snapshot is taken are recorded again afterwards, replaying them twice does no harm
+            self.width = game.maze.width
+            data, time = self.snapshot(game)
+            self.buffer.clear()
+        if self.file is not None:
+            self.file.close()
+        replace_file(self.path, lambda f: f.write(data))
+        self.file = open(self.path, "ab")
+        self.size = len(data)
+        self.snapshot_time = time
+        LOG.debug(f"journal compacted, snapshot: {len(data)} bytes")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_journal(path=JOURNAL_FILE):    # replays the journal, returns the game in the userdata.current_play format or None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < JOURNAL_HEADER.size:
+        return None
+    magic, width, height, lvl = JOURNAL_HEADER.unpack_from(data)
+    offset = JOURNAL_HEADER.size + width * height
+    if magic != JOURNAL_MAGIC or len(data) < offset:
+        LOG.warning(f"ignoring broken journal {path}")
+        return None
+
+    cells = bytearray(data[JOURNAL_HEADER.size:offset])
+    player = None
+    time = 0
+    respawns = {}
+    ghosts = {}
+    timers = None
+    while offset < len(data):
+        kind = data[offset]
+        record = RECORDS.get(kind)
+        if record is None or offset + record.size > len(data):
+            LOG.warning(f"journal ends with {len(data) - offset} unreadable bytes, ignoring them")    # cut off by a crash
+            break
+        values = record.unpack_from(data, offset)[1:]
+        offset += record.size
+
+        if kind == BLOCK:
+            cells[values[0]] = values[1]
+        elif kind == PLAYER:
+            player = values
+        elif kind == TIME:
+            time = values[0]
+        elif kind == RESPAWN:
+            key, entity, x, y, deadline = values
+            respawns[key] = (chr(entity), [x, y], deadline)
+        elif kind == RESPAWNED:
+            respawns.pop(values[0], None)
+        elif kind == GHOST:
+            ghost_id, x, y, symbol, next_move = values
+            ghosts[ghost_id] = (x, y, chr(symbol), next_move)
+        elif kind == TIMERS:
+            timers = values
+
+    if player is None or timers is None:
+        return None
+    text = cells.decode("ascii")
+    x, y, coins, is_alive = player
+    return {
+        "is_alive": is_alive,
+        "score": coins,
+        "position": [x, y],
+        "maze": [text[row * width:(row + 1) * width] for row in range(height)],
+        "pending_respawns": {str(key): [entity, pos, max(0, deadline - time)] for key, (entity, pos, deadline) in respawns.items()},
+        "lvl": lvl.rstrip(b"\0").decode("ascii"),
+        "ghosts": [[x, y, symbol, max(0, next_move - time)] for x, y, symbol, next_move in (ghosts[ghost_id] for ghost_id in sorted(ghosts))],
+        "timers": {"ghost_spawn": max(0, timers[0] - time), "bigcoin_spawn": max(0, timers[1] - time)},
+    }
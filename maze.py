@@ -0,0 +1,138 @@
+import random
+import threading
+from array import array
+
+from constants import *
+
+
+# every symbol is stored as its ascii code, one byte per block
+SYMBOL_CODES = {symbol: ord(symbol) for symbol in (WALL_SYMBOL, EMPTY_SYMBOL, COIN_SYMBOL, BIGCOIN_SYMBOL, GHOST_SYMBOL)}
+CODE_SYMBOLS = {code: symbol for symbol, code in SYMBOL_CODES.items()}
+
+WALL_CODE = SYMBOL_CODES[WALL_SYMBOL]
+EMPTY_CODE = SYMBOL_CODES[EMPTY_SYMBOL]
+COIN_CODE = SYMBOL_CODES[COIN_SYMBOL]
+BIGCOIN_CODE = SYMBOL_CODES[BIGCOIN_SYMBOL]
+GHOST_CODE = SYMBOL_CODES[GHOST_SYMBOL]
+
+WALKABLE_TABLE = bytes(0 if code == WALL_CODE else 1 for code in range(256))     # for bytes.translate()
+
+
+def sample_accepted(count, item, rng=random, accept=None, attempts=32):     # uniform choice among item(0) ... item(count - 1) that accept() takes, None if there is none
+    # a rejected draw is drawn again, after too many tries the items get filtered instead (most of them are rejected)
+    if count == 0:
+        return None
+    for _ in range(attempts):
+        value = item(rng.randrange(count))
+        if accept is None or accept(value):
+            return value
+    candidates = [value for value in map(item, range(count)) if accept is None or accept(value)]
+    return rng.choice(candidates) if candidates else None
+
+
+# blocks per symbol code, every list can be indexed so that a random block of a symbol is drawn in O(1)
+# a block is removed by moving the last block of its list into its place
+class SymbolIndex:
+    def __init__(self, cells):
+        self.blocks = {code: [] for code in CODE_SYMBOLS}     # code: cell indices
+        self.position = array("i", bytes(4 * len(cells)))     # where every cell is in the list of its code
+        for index, code in enumerate(cells):
+            self.add(code, index)
+
+    def add(self, code, index):
+        blocks = self.blocks.setdefault(code, [])
+        self.position[index] = len(blocks)
+        blocks.append(index)
+
+    def remove(self, code, index):
+        blocks = self.blocks[code]
+        position = self.position[index]
+        last = blocks.pop()
+        if last != index:
+            blocks[position] = last
+            self.position[last] = position
+
+    def change(self, index, old_code, code):
+        if old_code != code:
+            self.remove(old_code, index)
+            self.add(code, index)
+
+
+# replaces the list of strings, writes change a single byte instead of rebuilding the row
+# writes are applied right away under a lock, single block reads don't need it (one byte can't be read half written)
+class MazeGrid:
+    def __init__(self, rows):
+        self.width = len(rows[0])
+        self.height = len(rows)
+        self.cells = bytearray("".join(rows), "ascii")
+        if len(self.cells) != self.width * self.height:
+            raise ValueError("all maze rows need the same length")
+        self.lock = threading.Lock()
+        self.version = 0    # increases with every write, lets readers notice changes
+        self.symbol_index = SymbolIndex(self.cells)     # kept up to date by every write
+
+    def index(self, x_block, y_block):      # block positions start from 1x1
+        if not (1 <= x_block <= self.width and 1 <= y_block <= self.height):
+            raise IndexError(f"block {x_block},{y_block} is outside of the maze")
+        return (y_block - 1) * self.width + (x_block - 1)
+
+    def get(self, x_block, y_block):
+        return CODE_SYMBOLS[self.cells[self.index(x_block, y_block)]]
+
+    def set(self, x_block, y_block, symbol):
+        index = self.index(x_block, y_block)
+        with self.lock:
+            self.write(index, SYMBOL_CODES[symbol])
+            self.version += 1
+
+    def swap(self, x_block, y_block, symbol, x_block2, y_block2, symbol2):     # both blocks change together, e.g. a moving ghost
+        index = self.index(x_block, y_block)
+        index2 = self.index(x_block2, y_block2)
+        with self.lock:
+            self.write(index, SYMBOL_CODES[symbol])
+            self.write(index2, SYMBOL_CODES[symbol2])
+            self.version += 1
+
+    def replace(self, x_block, y_block, old_symbol, symbol):   # only writes if the block still holds old_symbol
+        index = self.index(x_block, y_block)
+        with self.lock:
+            if self.cells[index] != SYMBOL_CODES[old_symbol]:
+                return False
+            self.write(index, SYMBOL_CODES[symbol])
+            self.version += 1
+            return True
+
+    def write(self, index, code):      # only call with the lock held
+        self.symbol_index.change(index, self.cells[index], code)
+        self.cells[index] = code
+
+    def random_block(self, symbols, rng=random, exclude=None, attempts=32):     # uniform choice among the blocks of these symbols, None if there is none
+        # exclude(pos) -> True rejects a block
+        def block(n):       # n-th block of all the lists together
+            for blocks in lists:
+                if n < len(blocks):
+                    return self.position(blocks[n])
+                n -= len(blocks)
+
+        accept = None if exclude is None else lambda pos: not exclude(pos)
+        with self.lock:
+            lists = [self.symbol_index.blocks.get(SYMBOL_CODES[symbol], []) for symbol in symbols]
+            return sample_accepted(sum(len(blocks) for blocks in lists), block, rng, accept, attempts)
+
+    def position(self, index):     # cell index to block position
+        return index % self.width + 1, index // self.width + 1
+
+    def count(self, symbol):       # O(1), the symbol index always knows how many blocks a symbol has
+        return len(self.symbol_index.blocks.get(SYMBOL_CODES[symbol], ()))
+
+    def counts(self):      # symbol: number of blocks, for every symbol
+        with self.lock:
+            return {CODE_SYMBOLS[code]: len(blocks) for code, blocks in self.symbol_index.blocks.items() if code in CODE_SYMBOLS}
+
+    def walkable(self):     # 1 for every block that isn't a wall, same layout as cells
+        return bytearray(self.cells.translate(WALKABLE_TABLE))
+
+    def rows(self):     # legacy format, only needed for saving
+        with self.lock:     # no half done swap in the snapshot
+            text = self.cells.decode("ascii")
+        return [text[y * self.width:(y + 1) * self.width] for y in range(self.height)]
@@ -0,0 +1,106 @@
+import sys
+import json
+import random
+import argparse
+from collections import deque
+
+from constants import *
+from pathfinding import DIRECTIONS
+
+# random maps in the config format: {"data": [rows of symbols], "spawn": "random" or [x, y]}
+# a perfect maze (exactly one way between two blocks) is carved first, then walls between two corridors
+# are removed to add loops; same seed and arguments always give the same map
+# usage: python mazegen.py --width 101 --height 61 --loops 0.2 --coins 0.8 --seed 3 > map.json
+
+SYMBOLS = (WALL_SYMBOL, EMPTY_SYMBOL, COIN_SYMBOL, BIGCOIN_SYMBOL, GHOST_SYMBOL)
+
+
+def generate_map(width, height, seed=None, loop_density=0.1, coin_density=1.0, spawn="random"):
+    # loop_density: share of the inner walls between two corridors that get removed (0: perfect maze, 1: grid of pillars)
+    # coin_density: share of the walkable blocks that start with a coin, the others are empty
+    # spawn: "random" (the game picks one on every start) or "fixed" (one block picked here)
+    if width < 5 or height < 5:
+        raise ValueError("maps need at least 5x5 blocks")
+    if not 0 <= loop_density <= 1 or not 0 <= coin_density <= 1:
+        raise ValueError("densities have to be between 0 and 1")
+
+    rng = random.Random(seed)
+    rows = [[WALL_SYMBOL] * width for _ in range(height)]     # border stays wall, corridors are on odd positions
+
+    stack = [(1, 1)]
+    rows[1][1] = EMPTY_SYMBOL
+    while stack:    # depth first search with a random order of the neighbours
+        x, y = stack[-1]
+        options = [(dx, dy) for dx, dy in DIRECTIONS
+                   if 0 < x + 2 * dx < width - 1 and 0 < y + 2 * dy < height - 1 and rows[y + 2 * dy][x + 2 * dx] == WALL_SYMBOL]
+        if not options:
+            stack.pop()
+            continue
+        dx, dy = rng.choice(options)
+        rows[y + dy][x + dx] = EMPTY_SYMBOL
+        rows[y + 2 * dy][x + 2 * dx] = EMPTY_SYMBOL
+        stack.append((x + 2 * dx, y + 2 * dy))
+
+    walls_between = [(x, y) for y in range(1, height - 1) for x in range(1, width - 1)    # walls that separate two corridors
+                     if rows[y][x] == WALL_SYMBOL and (x + y) % 2 == 1
+                     and ((rows[y][x - 1] != WALL_SYMBOL and rows[y][x + 1] != WALL_SYMBOL) or (rows[y - 1][x] != WALL_SYMBOL and rows[y + 1][x] != WALL_SYMBOL))]
+    for x, y in rng.sample(walls_between, round(len(walls_between) * loop_density)):
+        rows[y][x] = EMPTY_SYMBOL
+
+    walkable = [(x, y) for y in range(height) for x in range(width) if rows[y][x] != WALL_SYMBOL]
+    for x, y in walkable:
+        if rng.random() < coin_density:
+            rows[y][x] = COIN_SYMBOL
+
+    map_data = {"data": ["".join(row) for row in rows], "spawn": "random"}
+    if spawn == "fixed":
+        x, y = rng.choice(walkable)
+        map_data["spawn"] = [x + 1, y + 1]      # block positions start from 1x1
+    elif spawn != "random":
+        raise ValueError(f"unknown spawn: {spawn}")
+    return map_data
+
+def validate_map(map_data):     # raises ValueError if the game couldn't play the map
+    rows = map_data["data"]
+    if not rows or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError("all maze rows need the same length")
+    unknown = set("".join(rows)) - set(SYMBOLS)
+    if unknown:
+        raise ValueError(f"unknown symbols: {sorted(unknown)}")
+
+    walkable = {(x + 1, y + 1) for y, row in enumerate(rows) for x, char in enumerate(row) if char != WALL_SYMBOL}
+    if not walkable:
+        raise ValueError("the map has no walkable block")
+    spawn = map_data["spawn"]
+    if spawn != "random" and tuple(spawn) not in walkable:
+        raise ValueError(f"spawn {spawn} is not walkable")
+
+    start = next(iter(walkable))    # every walkable block has to be reachable, otherwise ghosts can't find the player
+    reached = {start}
+    todo = deque([start])
+    while todo:
+        x, y = todo.popleft()
+        for dx, dy in DIRECTIONS:
+            nb = (x + dx, y + dy)
+            if nb in walkable and nb not in reached:
+                reached.add(nb)
+                todo.append(nb)
+    if len(reached) != len(walkable):
+        raise ValueError(f"{len(walkable) - len(reached)} walkable blocks can't be reached")
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="generate a random pac-man map")
+    parser.add_argument("--width", type=int, default=29)
+    parser.add_argument("--height", type=int, default=22)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--loops", type=float, default=0.1, help="loop density from 0 (perfect maze) to 1")
+    parser.add_argument("--coins", type=float, default=1.0, help="coin density from 0 to 1")
+    parser.add_argument("--spawn", choices=["random", "fixed"], default="random")
+    args = parser.parse_args(args)
+
+    map_data = generate_map(args.width, args.height, args.seed, args.loops, args.coins, args.spawn)
+    json.dump(map_data, sys.stdout, indent=4)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+import random
+import threading
+import heapq
+import hashlib
+import struct
+import array
+import mmap
+import sys
+import os
+import logging
+from collections import deque
+
+from constants import *
+from maze import MazeGrid, sample_accepted
+from files import replace_file
+
+PATHFINDING_LOG = logging.getLogger("pathfinding")
+
+
+# index is the direction code, the same codes Ghost.auto_move() turns into steps
+# 0: O, 1: W, 2: S, 3: N
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+UNREACHABLE = -1
+
+
+def build_walkable(maze):      # flat grid (row after row), 1 = walkable; coins, bigcoins and ghosts count as walkable like in check_collision()
+    if isinstance(maze, MazeGrid):
+        return maze.walkable(), maze.width
+    width = len(maze[0])
+    walkable = bytearray(width * len(maze))
+    for y, row in enumerate(maze):
+        offset = y * width
+        for x, char in enumerate(row):
+            if char != WALL_SYMBOL:
+                walkable[offset + x] = 1
+    return walkable, width
+
+def neighbours(walkable, width, index):     # yields (direction, index) of walkable neighbours in direction order
+    x = index % width
+    if x + 1 < width and walkable[index + 1]:                       # O
+        yield 0, index + 1
+    if x > 0 and walkable[index - 1]:                               # W
+        yield 1, index - 1
+    if index + width < len(walkable) and walkable[index + width]:   # S
+        yield 2, index + width
+    if index - width >= 0 and walkable[index - width]:              # N
+        yield 3, index - width
+
+def pos_to_index(pos, width):   # block positions start from 1x1
+    return (pos[1] - 1) * width + (pos[0] - 1)
+
+def index_to_pos(index, width):
+    return index % width + 1, index // width + 1
+
+def in_grid(pos, walkable, width):
+    return 1 <= pos[0] <= width and 1 <= pos[1] <= len(walkable) // width
+
+def bfs_distances(walkable, width, source, stop_at=None):      # iterative bfs, every block is visited at most once
+    dist = [UNREACHABLE] * len(walkable)
+    dist[source] = 0
+    todo = deque((source,))
+    while todo:
+        current = todo.popleft()
+        next_dist = dist[current] + 1
+        for _, nb in neighbours(walkable, width, current):
+            if dist[nb] == UNREACHABLE:
+                dist[nb] = next_dist
+                if nb == stop_at:       # every block closer than stop_at is known by now
+                    return dist
+                todo.append(nb)
+    return dist
+
+def walk_down(walkable, width, dist, start, randomize=False, rng=random):     # follows falling distances to the bfs source
+    directions = []
+    current = start
+    while dist[current] > 0:
+        options = [(direction, nb) for direction, nb in neighbours(walkable, width, current) if dist[nb] == dist[current] - 1]
+        if randomize:       # any of the shortest ways
+            direction, current = rng.choice(options)
+        else:               # always the first way in direction order
+            direction, current = options[0]
+        directions.append(direction)
+    return directions
+
+def shortest_way(maze, starting_pos, ending_pos, randomize=False, rng=random):    # returns list of directions, [] if already there, False if there is no way
+    if starting_pos == ending_pos:
+        return []
+
+    walkable, width = build_walkable(maze)
+    if not in_grid(starting_pos, walkable, width) or not in_grid(ending_pos, walkable, width):
+        return False
+
+    start = pos_to_index(starting_pos, width)
+    end = pos_to_index(ending_pos, width)
+    if not walkable[start] or not walkable[end]:
+        return False
+
+    dist = bfs_distances(walkable, width, end, stop_at=start)      # searching backwards so that the way can be read from start
+    if dist[start] == UNREACHABLE:
+        PATHFINDING_LOG.debug("no way found")
+        return False
+
+    return walk_down(walkable, width, dist, start, randomize, rng)
+
+
+class DistanceField:        # bfs distances from one target block, shared by every entity walking towards that target
+    def __init__(self, maze):
+        self.walkable, self.width = build_walkable(maze)
+        self.unreachable = len(self.walkable) + 1      # larger than any real distance, keeps min() and comparisons simple
+        self.links = [self.find_links(index) for index in range(len(self.walkable))]  # walkable neighbours per block, changes only with walls
+        self.target = None
+        self.dist = None
+        self.order = None               # reachable blocks sorted by distance, the bfs visits them in that order anyway
+        self.layer_start = None         # distance: first position of that distance in order
+        self.lock = threading.Lock()    # readers are ghost threads, updates come from the player and maze writes
+        self.last_updates = 0           # blocks touched by the last update, for debugging
+
+    def find_links(self, index):
+        return tuple(neighbours(self.walkable, self.width, index))
+
+    # moving the target by one block changes every reachable distance by exactly one (the grid is a checkerboard, so
+    # the parity flips), a repair would touch every block anyway; a plain bfs over the precomputed links is cheaper
+    def set_target(self, pos):
+        if not in_grid(pos, self.walkable, self.width):
+            return
+        target = pos_to_index(pos, self.width)
+        with self.lock:
+            if target == self.target:
+                return
+            self.target = target
+            self.fill()
+        PATHFINDING_LOG.debug(f"distance field updated, touched blocks: {self.last_updates}")
+
+    def fill(self):
+        unreachable = self.unreachable
+        links = self.links
+        dist = [unreachable] * len(self.walkable)
+        dist[self.target] = 0
+        frontier = [self.target]
+        order = [self.target]
+        layer_start = [0]
+        d = 0
+        while frontier:     # layer by layer, no queue needed
+            d += 1
+            layer_start.append(len(order))
+            next_frontier = []
+            for index in frontier:
+                for _, nb in links[index]:
+                    if dist[nb] == unreachable:
+                        dist[nb] = d
+                        next_frontier.append(nb)
+            order.extend(next_frontier)
+            frontier = next_frontier
+        self.dist = dist
+        self.order = order
+        self.layer_start = layer_start
+        self.last_updates = len(dist)
+
+    def set_block(self, pos, symbol):   # call on every maze write, only walls make a difference
+        if not in_grid(pos, self.walkable, self.width):
+            return
+        index = pos_to_index(pos, self.width)
+        walkable = 0 if symbol == WALL_SYMBOL else 1
+        with self.lock:
+            if self.walkable[index] == walkable:
+                return
+            self.walkable[index] = walkable
+            for changed in (index, *self.adjacent(index)):
+                self.links[changed] = self.find_links(changed)
+            if self.dist is not None:
+                self.repair((index, *self.adjacent(index)))
+                self.order = None       # the buckets don't survive a repair, random_block() fills again if needed
+        PATHFINDING_LOG.debug(f"distance field repaired after wall change, touched blocks: {self.last_updates}")
+
+    def adjacent(self, index):      # every neighbour inside the grid, walkable or not
+        x = index % self.width
+        if x + 1 < self.width:
+            yield index + 1
+        if x > 0:
+            yield index - 1
+        if index + self.width < len(self.walkable):
+            yield index + self.width
+        if index - self.width >= 0:
+            yield index - self.width
+
+    def expected(self, index):      # what the distance should be judging by the neighbours
+        if index == self.target:
+            return 0
+        if not self.walkable[index]:
+            return self.unreachable
+        best = self.unreachable
+        for nb in self.adjacent(index):
+            if (self.walkable[nb] or nb == self.target) and self.dist[nb] < best:  # the target always counts, like the start of a bfs
+                best = self.dist[nb]
+        return min(best + 1, self.unreachable)
+
+    def repair(self, changed):      # dynamic bfs: only blocks whose distance is inconsistent get touched (lpa* without heuristic)
+        dist = self.dist
+        todo = []
+        for index in changed:
+            expected = self.expected(index)
+            if dist[index] != expected:
+                heapq.heappush(todo, (min(dist[index], expected), index))
+
+        updates = 0
+        while todo:
+            key, index = heapq.heappop(todo)
+            expected = self.expected(index)
+            if dist[index] == expected:     # already fixed by an earlier entry
+                continue
+            if key != min(dist[index], expected):   # outdated entry, requeue with the current key
+                heapq.heappush(todo, (min(dist[index], expected), index))
+                continue
+
+            updates += 1
+            if dist[index] > expected:      # got closer: settle it
+                dist[index] = expected
+            else:                           # got further away: forget it and let the neighbours decide again
+                dist[index] = self.unreachable
+                expected = self.expected(index)
+                if dist[index] != expected:
+                    heapq.heappush(todo, (expected, index))
+
+            for nb in self.adjacent(index):
+                expected = self.expected(nb)
+                if dist[nb] != expected:
+                    heapq.heappush(todo, (min(dist[nb], expected), nb))
+
+        self.last_updates = updates
+
+    def distance(self, pos):
+        if self.dist is None or not in_grid(pos, self.walkable, self.width):
+            return UNREACHABLE
+        d = self.dist[pos_to_index(pos, self.width)]
+        return UNREACHABLE if d >= self.unreachable else d
+
+    def random_block(self, min_distance, rng=random, accept=None, attempts=32):    # uniform choice among the blocks at least min_distance steps away, None if there is none
+        # accept(pos) -> False rejects a block (e.g. occupied)
+        with self.lock:
+            if self.target is None:
+                return None
+            if self.order is None:
+                self.fill()
+            order = self.order
+            start = self.layer_start[min_distance] if min_distance < len(self.layer_start) else len(order)
+            return sample_accepted(len(order) - start, lambda n: index_to_pos(order[start + n], self.width), rng, accept, attempts)
+
+    def next_step(self, pos, randomize=False, rng=random):      # direction of the first step towards the target, False if already there or no way
+        if not in_grid(pos, self.walkable, self.width):
+            return False
+        current = pos_to_index(pos, self.width)
+        with self.lock:
+            dist = self.dist
+            if dist is None or dist[current] == 0 or dist[current] >= self.unreachable:  # no target yet, already there or unreachable
+                return False
+            options = [direction for direction, nb in self.links[current] if dist[nb] == dist[current] - 1]
+        if not options:
+            return False
+        if randomize:
+            return rng.choice(options)
+        return options[0]
+
+
+# all-pairs distances between walkable blocks, compiled once per wall layout and memory-mapped from disk
+# file: header + blocks * blocks unsigned shorts (row: from block, column: to block)
+PATH_TABLE_HEADER = struct.Struct("<4sIII")     # magic, width, height, blocks
+PATH_TABLE_MAGIC = b"PTB1"
+PATH_TABLE_UNREACHABLE = 0xFFFF
+
+
+def wall_layout_hash(walkable, width):      # coins, ghosts etc. don't matter, so a continued game shares the table with the map
+    return hashlib.sha256(width.to_bytes(4, "little") + bytes(walkable)).hexdigest()
+
+def compile_path_table(walkable, width, blocks, path):
+    ids = [-1] * len(walkable)
+    for block_id, index in enumerate(blocks):
+        ids[index] = block_id
+
+    table = array.array("H", bytes(2 * len(blocks) * len(blocks)))
+    row = 0
+    for index in blocks:
+        dist = bfs_distances(walkable, width, index)
+        for other in blocks:
+            d = dist[other]
+            table[row] = d if d != UNREACHABLE else PATH_TABLE_UNREACHABLE
+            row += 1
+
+    if sys.byteorder != "little":
+        table.byteswap()
+
+    def write(f):
+        f.write(PATH_TABLE_HEADER.pack(PATH_TABLE_MAGIC, width, len(walkable) // width, len(blocks)))
+        table.tofile(f)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    replace_file(path, write)     # parallel runs may compile the same table
+
+def load_path_table(maze, cache_dir=PATH_TABLE_CACHE_DIR):   # returns None if the map is too big for a table
+    walkable, width = build_walkable(maze)
+    blocks = [index for index in range(len(walkable)) if walkable[index]]
+    if len(blocks) > PATH_TABLE_MAX_BLOCKS:
+        PATHFINDING_LOG.info(f"map too big for a path table ({len(blocks)} blocks), using distance field")
+        return None
+
+    path = os.path.join(cache_dir, wall_layout_hash(walkable, width) + ".bin")
+    for attempt in range(2):
+        if not os.path.exists(path):
+            PATHFINDING_LOG.info(f"compiling path table for {len(blocks)} blocks")
+            try:
+                compile_path_table(walkable, width, blocks, path)
+            except OSError as e:
+                PATHFINDING_LOG.warning(f"couldn't write path table: {e}")
+                return None
+        try:
+            return PathTable(walkable, width, blocks, path)
+        except (OSError, ValueError) as e:     # broken or outdated file, compile again
+            PATHFINDING_LOG.warning(f"couldn't load path table, recompiling: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                return None
+    return None
+
+
+class PathTable:
+    def __init__(self, walkable, width, blocks, path):
+        self.walkable = bytearray(walkable)
+        self.width = width
+        self.blocks = len(blocks)
+        self.ids = [-1] * len(walkable)
+        for block_id, index in enumerate(blocks):
+            self.ids[index] = block_id
+        self.valid = True       # false as soon as a wall changes
+
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mmap) < PATH_TABLE_HEADER.size:     # cut off while it was written by something else
+            self.mmap.close()
+            raise ValueError(f"path table {path} is too short")
+        magic, file_width, file_height, file_blocks = PATH_TABLE_HEADER.unpack_from(self.mmap)
+        expected_size = PATH_TABLE_HEADER.size + 2 * self.blocks * self.blocks
+        if magic != PATH_TABLE_MAGIC or file_width != width or file_blocks != self.blocks or len(self.mmap) != expected_size:
+            self.mmap.close()
+            raise ValueError(f"path table {path} doesn't match the map")
+        if sys.byteorder != "little":   # memoryview can't swap bytes, read a copy instead
+            self.dist = array.array("H", self.mmap[PATH_TABLE_HEADER.size:])
+            self.dist.byteswap()
+        else:
+            self.dist = memoryview(self.mmap)[PATH_TABLE_HEADER.size:].cast("H")
+
+    def set_block(self, pos, symbol):   # call on every maze write, a changed wall makes the table useless
+        if not in_grid(pos, self.walkable, self.width):
+            return
+        index = pos_to_index(pos, self.width)
+        if self.walkable[index] != (0 if symbol == WALL_SYMBOL else 1):
+            self.valid = False
+
+    def distance(self, starting_pos, ending_pos):
+        if not in_grid(starting_pos, self.walkable, self.width) or not in_grid(ending_pos, self.walkable, self.width):
+            return UNREACHABLE
+        start = self.ids[pos_to_index(starting_pos, self.width)]
+        end = self.ids[pos_to_index(ending_pos, self.width)]
+        if start == -1 or end == -1:
+            return UNREACHABLE
+        d = self.dist[start * self.blocks + end]
+        return UNREACHABLE if d == PATH_TABLE_UNREACHABLE else d
+
+    def next_step(self, pos, target, randomize=False, rng=random):     # same as DistanceField.next_step() but for any target
+        d = self.distance(pos, target)
+        if d <= 0:      # already there or unreachable
+            return False
+        end = self.ids[pos_to_index(target, self.width)]
+        options = [direction for direction, nb in neighbours(self.walkable, self.width, pos_to_index(pos, self.width))
+                   if self.dist[self.ids[nb] * self.blocks + end] == d - 1]
+        if not options:
+            return False
+        if randomize:
+            return rng.choice(options)
+        return options[0]
+
+    def shortest_way(self, starting_pos, ending_pos, randomize=False, rng=random):     # same result as shortest_way() without searching
+        if starting_pos == ending_pos:
+            return []
+        if self.distance(starting_pos, ending_pos) == UNREACHABLE:
+            return False
+        directions = []
+        pos = starting_pos
+        while pos != ending_pos:
+            direction = self.next_step(pos, ending_pos, randomize, rng)
+            directions.append(direction)
+            pos = (pos[0] + DIRECTIONS[direction][0], pos[1] + DIRECTIONS[direction][1])
+        return directions
@@ -0,0 +1,97 @@
+import heapq
+import math
+import logging
+import threading
+from time import monotonic, sleep
+
+LOG = logging.getLogger("main")
+
+
+# all item respawns in one heap instead of one sleeping thread per collected coin, run_due() is called by the game loop
+# respawn(entity, pos) returns False if the block is taken, the item then retries after its delay again
+# on_change(key, entity, pos, deadline) is told about every new deadline, deadline None: the item respawned
+class RespawnScheduler:
+    def __init__(self, respawn, clock=monotonic, on_change=None):
+        self.respawn = respawn
+        self.clock = clock      # game time, not wall time
+        self.on_change = on_change
+        self.heap = []          # (deadline, key), the earliest deadline is always on top
+        self.items = {}         # key: [entity, pos, deadline, delay]
+        self.next_key = 0
+        self.lock = threading.Lock()    # the save thread reads pending() while the game loop respawns
+
+    def schedule(self, entity, pos, in_future=0):
+        with self.lock:
+            key = self.next_key
+            self.next_key += 1
+            deadline = self.clock() + in_future
+            self.items[key] = [entity, pos, deadline, in_future]
+            heapq.heappush(self.heap, (deadline, key))
+        if self.on_change is not None:
+            self.on_change(key, entity, pos, deadline)
+        return key
+
+    def pending(self):      # remaining time in full seconds, same format as userdata.current_play.pending_respawns
+        now = self.clock()
+        with self.lock:
+            return {key: [entity, pos, max(0, math.ceil(deadline - now))] for key, (entity, pos, deadline, _) in self.items.items()}
+
+    def deadlines(self):    # key: (entity, pos, deadline in game time), exact unlike pending()
+        with self.lock:
+            return {key: (entity, pos, deadline) for key, (entity, pos, deadline, _) in self.items.items()}
+
+    def run_due(self, now=None):    # respawns everything that is due, returns how many items were handled
+        if now is None:
+            now = self.clock()
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, key = heapq.heappop(self.heap)
+                due.append((key, self.items[key]))
+
+        for key, (entity, pos, _, delay) in due:     # outside of the lock, respawning writes to the maze
+            if self.respawn(entity, pos):
+                with self.lock:
+                    del self.items[key]
+                retry = None
+            else:
+                retry = now + max(delay, 1)     # at least one second, otherwise a blocked item would spin
+                with self.lock:
+                    self.items[key][2] = retry
+                    heapq.heappush(self.heap, (retry, key))
+            if self.on_change is not None:
+                self.on_change(key, entity, pos, retry)
+        return len(due)
+
+
+# calls tick() every step seconds, the game only advances in these fixed steps, so a slow tick doesn't change the game speed
+# if ticks take too long the loop catches up (up to max_catch_up ticks in a row) before skipping time
+class FixedTimestep:
+    def __init__(self, step, tick, clock=monotonic, max_catch_up=5):
+        self.step = step
+        self.tick = tick
+        self.clock = clock
+        self.max_catch_up = max_catch_up
+        self.ticks = 0
+        self.last_tick_time = 0     # in sec, how long the last tick took (compare with step for the budget)
+
+    def run(self, is_running):
+        next_time = self.clock()
+        while is_running():
+            now = self.clock()
+            if now < next_time:
+                sleep(next_time - now)
+                continue
+
+            if now - next_time > self.step * self.max_catch_up:    # too far behind, skip instead of running lots of ticks at once
+                skipped = int((now - next_time) / self.step)
+                LOG.debug(f"game loop is behind, skipping {skipped} ticks")
+                next_time += skipped * self.step
+
+            begin = self.clock()
+            self.tick()
+            self.last_tick_time = self.clock() - begin
+            self.ticks += 1
+            if self.last_tick_time > self.step:
+                LOG.debug(f"tick {self.ticks} took {self.last_tick_time * 1000:.1f} ms, budget is {self.step * 1000:.1f} ms")
+            next_time += self.step
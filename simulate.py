@@ -0,0 +1,265 @@
+import sys
+import os
+import json
+import math
+import argparse
+import logging
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import game as game_module
+from constants import *
+from game import Game
+from pathfinding import DIRECTIONS, bfs_distances, walk_down, neighbours, pos_to_index, load_path_table
+from maze import MazeGrid, COIN_CODE, BIGCOIN_CODE, GHOST_CODE
+
+# plays whole games without a window on virtual time: every tick runs right after the other, nothing sleeps
+# usage: python simulate.py --games 100 --policy greedy --level easy --level hard --set COIN_RESPAWN_TIME=20
+#        python simulate.py --games 10000 --workers 0     (all cpus)
+
+LOG = logging.getLogger("simulate")
+
+LEVELS = ["easy", "medium", "hard"]
+
+
+# player policies: called whenever the player can move, return (dx, dy); (0, 0) stays on the block
+
+def idle_policy(game, rng):
+    return 0, 0
+
+def random_policy(game, rng):      # any direction that isn't a wall
+    player = game.player
+    options = [(dx, dy) for dx, dy in DIRECTIONS if game.check_collision(player, dx, dy)[0]]
+    if not options:
+        return 0, 0
+    return rng.choice(options)
+
+def is_safe(game, index, walkable):     # no ghost on the block or next to it
+    cells = game.maze.cells
+    if cells[index] == GHOST_CODE:
+        return False
+    return all(cells[nb] != GHOST_CODE for _, nb in neighbours(walkable, game.maze.width, index))
+
+def greedy_policy(game, rng):      # walks to the nearest coin or bigcoin, dodges blocks next to ghosts
+    maze = game.maze
+    player = game.player
+    walkable = maze.walkable()
+    start = pos_to_index((player.x, player.y), maze.width)
+    dist = bfs_distances(walkable, maze.width, start)
+
+    coins = [index for index, code in enumerate(maze.cells) if (code == COIN_CODE or code == BIGCOIN_CODE) and dist[index] > 0]
+    if coins:
+        target = min(coins, key=lambda index: dist[index])
+        last_direction = walk_down(walkable, maze.width, dist, target)[-1]     # way from the coin back to the player
+        direction = last_direction ^ 1      # opposite direction: O <-> W, S <-> N
+        if is_safe(game, start + DIRECTIONS[direction][0] + DIRECTIONS[direction][1] * maze.width, walkable):
+            return DIRECTIONS[direction]
+
+    safe = [DIRECTIONS[direction] for direction, nb in neighbours(walkable, maze.width, start) if is_safe(game, nb, walkable)]
+    if safe:
+        return rng.choice(safe)
+    return random_policy(game, rng)
+
+POLICIES = {"idle": idle_policy, "random": random_policy, "greedy": greedy_policy}
+
+
+def load_maps(config_file=CONFIG_FILE):
+    with open(config_file, 'r') as f:
+        return json.load(f)["maps"]
+
+def override_constants(items, module=game_module):      # NAME=VALUE (json value), changes the constants the game logic uses for this process
+    for item in items:
+        name, value = item.split("=", 1)
+        if not hasattr(module, name):
+            raise ValueError(f"unknown constant: {name}")
+        setattr(module, name, json.loads(value))
+
+def run_game(map_data, lvl, policy="random", seed=None, max_seconds=600):     # one game until the player dies or max_seconds of game time
+    game = Game(map_data["data"], lvl, map_data["spawn"], seed=seed)
+    policy_function = POLICIES[policy]
+    rng = random.Random(seed)       # own random for the policy, so the game's own choices don't depend on the policy
+    max_ticks = game_module.seconds_to_ticks(max_seconds)
+
+    while game.running and game.ticks < max_ticks:
+        if game.player.can_move:
+            game.move_player(*policy_function(game, rng))
+        game.tick()
+
+    return {
+        "lvl": lvl,
+        "policy": policy,
+        "seed": seed,
+        "score": game.player.coins,
+        "survived": game.time(),    # in sec of game time
+        "alive": game.player.is_alive,
+        "ghosts": len(game.ghosts),
+        "ticks": game.ticks,
+    }
+
+
+class RunningStats:     # mean, variance and range without keeping the values, two of them can be merged (chan et al.)
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0       # sum of squared differences from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+class Summary:      # results per level, filled game by game so that no list of results is needed
+    def __init__(self):
+        self.levels = {}    # lvl: {"alive": games still alive at the end, "score", "survived", "ghosts": RunningStats}
+
+    def level(self, lvl):
+        if lvl not in self.levels:
+            self.levels[lvl] = {"alive": 0, "score": RunningStats(), "survived": RunningStats(), "ghosts": RunningStats()}
+        return self.levels[lvl]
+
+    def add(self, result):
+        values = self.level(result["lvl"])
+        values["alive"] += result["alive"]
+        for name in ("score", "survived", "ghosts"):
+            values[name].add(result[name])
+
+    def merge(self, other):
+        for lvl, other_values in other.levels.items():
+            values = self.level(lvl)
+            values["alive"] += other_values["alive"]
+            for name in ("score", "survived", "ghosts"):
+                values[name].merge(other_values[name])
+
+    def as_dict(self):
+        summary = {}
+        for lvl in LEVELS + sorted(set(self.levels) - set(LEVELS)):
+            if lvl not in self.levels:
+                continue
+            values = self.levels[lvl]
+            score = values["score"]
+            summary[lvl] = {
+                "games": score.count,
+                "score_mean": score.mean,
+                "score_std": score.std(),
+                "score_min": score.min,
+                "score_max": score.max,
+                "survived_mean": values["survived"].mean,   # in sec of game time
+                "survival_rate": values["alive"] / score.count,     # still alive at max_seconds
+                "ghosts_mean": values["ghosts"].mean,
+            }
+        return summary
+
+def summarize(results):
+    summary = Summary()
+    for result in results:
+        summary.add(result)
+    return summary.as_dict()
+
+def print_summary(summary):
+    for lvl, values in summary.items():
+        print(f"{lvl:8} games: {values['games']:6}  score: {values['score_mean']:9.1f} (std {values['score_std']:.1f}, max {values['score_max']})  "
+              f"survived: {values['survived_mean']:7.1f}s  alive at end: {values['survival_rate']:6.1%}  ghosts: {values['ghosts_mean']:.1f}")
+
+
+# parallel runs: every game has its own seed (first seed + game number), so the result doesn't depend on
+# how the games are split between the workers; chunks are merged as soon as they are done
+
+def init_worker(overrides):
+    logging.basicConfig(level=logging.WARNING)
+    override_constants(overrides)
+
+def run_chunk(map_data, lvl, policy, seeds, max_seconds):     # runs in a worker, only the small summary goes back
+    summary = Summary()
+    for seed in seeds:
+        summary.add(run_game(map_data, lvl, policy, seed, max_seconds))
+    return summary
+
+def run_games(maps, levels, games, policy="random", seed=0, max_seconds=600, workers=1, chunk_size=50, overrides=()):
+    summary = Summary()
+    if workers == 1:
+        for lvl in levels:
+            for n in range(games):
+                summary.add(run_game(maps[lvl], lvl, policy, seed + n, max_seconds))
+        return summary
+
+    for lvl in levels:      # compile missing path tables once instead of in every worker
+        load_path_table(MazeGrid(maps[lvl]["data"]))
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(list(overrides),)) as executor:
+        futures = [executor.submit(run_chunk, maps[lvl], lvl, policy, range(seed + first, seed + min(first + chunk_size, games)), max_seconds)
+                   for lvl in levels for first in range(0, games, chunk_size)]
+        for done, future in enumerate(as_completed(futures), 1):
+            summary.merge(future.result())
+            LOG.info(f"{done}/{len(futures)} chunks done")
+    return summary
+
+def run_batch(maps, levels, games, policy="random", seed=0, max_seconds=600, overrides=()):     # same rules, vectorised, see batch.py
+    import batch as batch_module    # needs numpy
+    from batch import BatchGame
+
+    override_constants(overrides, batch_module)
+    if policy not in ("idle", "random"):
+        raise ValueError(f"the batch engine has no {policy} policy")
+    summary = Summary()
+    for lvl in levels:
+        batch = BatchGame(maps[lvl]["data"], lvl, games, maps[lvl]["spawn"], seed)
+        batch.run(policy, max_seconds)
+        for result in batch.results(policy):
+            summary.add(result)
+    return summary
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="run pac-man games without a window")
+    parser.add_argument("--games", type=int, default=100, help="games per level")
+    parser.add_argument("--level", action="append", choices=LEVELS, help="can be given multiple times, default: all")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, the others count up")
+    parser.add_argument("--max-seconds", type=float, default=600, help="game time after which a game is stopped")
+    parser.add_argument("--workers", type=int, default=1, help="processes, 0: one per cpu")
+    parser.add_argument("--chunk-size", type=int, default=50, help="games per task of a worker")
+    parser.add_argument("--engine", choices=["game", "batch"], default="game", help="batch: all games of a level at once with numpy (idle and random policy only)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a constant, e.g. COIN_RESPAWN_TIME=20")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--json", action="store_true", help="print the summary as json")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+    override_constants(args.set)
+    maps = load_maps(args.config)
+
+    if args.engine == "batch":
+        summary = run_batch(maps, args.level or LEVELS, args.games, args.policy, args.seed, args.max_seconds, args.set).as_dict()
+    else:
+        workers = args.workers or os.cpu_count()
+        summary = run_games(maps, args.level or LEVELS, args.games, args.policy, args.seed, args.max_seconds, workers, args.chunk_size, args.set).as_dict()
+    if args.json:
+        json.dump(summary, sys.stdout, indent=4)
+        print()
+    else:
+        print_summary(summary)
+
+if __name__ == "__main__":
+    main()